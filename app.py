@@ -2,18 +2,22 @@
 # app.py
 from __future__ import annotations
 import os
+import pickle
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
-import numpy as np
 import pandas as pd
 import streamlit as st
 
-from settings import APP_TITLE, APP_TAGLINE, ASSETS, THRESHOLDS, TTL
+from settings import APP_TITLE, APP_TAGLINE, ASSETS, ASSETS_FLAT, THRESHOLDS, TTL_SECONDS
+from data_sources import instrumented_cache, source_cache_stats
 from indicators import (
     compute_ttm_pe, compute_cape, compute_buffett_indicator, compute_margin_debt_yoy,
-    compute_concentration_top10, compute_sentiment_proxy, compute_asset_trend, guidance_label
+    compute_concentration_top10, compute_sentiment_proxy, compute_asset_trend, get_price_series_batch, guidance_label,
+    downsample_lttb, COLOR_CODES, COLOR_SCORES
 )
-from ui_components import series_tile, price_panel, overall_strip, data_health
+from ui_components import series_tile, price_panel, overall_strip, data_health, inject_styles
 
 
 st.set_page_config(page_title=APP_TITLE, page_icon="📊", layout="wide")
@@ -27,6 +31,7 @@ st.markdown("""
 h1, h2, h3, h4 { letter-spacing: 0.2px; }
 </style>
 """, unsafe_allow_html=True)
+inject_styles()
 
 st.title(APP_TITLE)
 st.caption(APP_TAGLINE)
@@ -35,37 +40,72 @@ st.caption(APP_TAGLINE)
 page = st.sidebar.radio("Navigate", ["Market Overview", "Asset Browser", "Valuation Detail", "Signals", "Sources"])
 
 # Cache wrappers
-@st.cache_data(ttl=int(TTL["stooq_daily"].total_seconds()))
-def _ttm_pe_cached():
-    return compute_ttm_pe()
-
-@st.cache_data(ttl=int(TTL["shiller_monthly"].total_seconds()))
-def _cape_cached():
-    return compute_cape()
-
-@st.cache_data(ttl=int(TTL["finra_monthly"].total_seconds()))
-def _margin_cached():
-    return compute_margin_debt_yoy()
-
-@st.cache_data(ttl=int(TTL["holdings_daily"].total_seconds()))
-def _concentration_cached():
-    return compute_concentration_top10()
+_CACHE_STATS_KEY = "_cache_stats"
+_CACHE_STATS_MAX = 200
+
+
+def timed_cache(ttl: int, name: str):
+    """
+    instrumented_cache with a per-session log: each call appends name, hit/miss, duration and
+    (on misses) pickled result size to a ring buffer shown on the Sources page.
+    """
+    def record(result, miss: bool, seconds: float) -> None:
+        stats = st.session_state.setdefault(_CACHE_STATS_KEY, deque(maxlen=_CACHE_STATS_MAX))
+        stats.append({
+            "func": name,
+            "result": "miss" if miss else "hit",
+            "seconds": round(seconds, 4),
+            "bytes": len(pickle.dumps(result)) if miss else None,
+        })
+    return instrumented_cache(ttl, record)
+
+# The valuation metrics are network-bound (Stooq, Shiller, FRED, FINRA, CBOE, State Street);
+# fetch them concurrently so a cold start costs the slowest source, not the sum of all six.
+_METRIC_LOADERS = {
+    "pe": compute_ttm_pe,
+    "cape": compute_cape,
+    "buffett": compute_buffett_indicator,
+    "margin": compute_margin_debt_yoy,
+    "conc": compute_concentration_top10,
+    "sent": compute_sentiment_proxy,
+}
+
+# Keyed by the shortest TTL among the sources so the daily price-driven P/E stays fresh
+_METRICS_TTL = min(TTL_SECONDS[k] for k in ("stooq_daily", "shiller_monthly", "fred_quarterly", "finra_monthly", "holdings_daily", "cboe_daily"))
+
+
+@timed_cache(ttl=_METRICS_TTL, name="valuation metrics")
+def _load_all():
+    with ThreadPoolExecutor(max_workers=len(_METRIC_LOADERS)) as ex:
+        futures = {name: ex.submit(fn) for name, fn in _METRIC_LOADERS.items()}
+        return {name: f.result() for name, f in futures.items()}
+
+@timed_cache(ttl=TTL_SECONDS["stooq_daily"], name="asset trend")
+def _trend_cached(pref, fallback):
+    return compute_asset_trend(pref, fallback)
 
-@st.cache_data(ttl=int(TTL["cboe_daily"].total_seconds()))
-def _sentiment_cached():
-    return compute_sentiment_proxy()
+@st.cache_data(ttl=TTL_SECONDS["stooq_daily"], show_spinner=False)
+def _warm_region(region: str) -> int:
+    # One parallel fan-out over the region's Stooq/Yahoo instruments; switching instruments is then a cache hit
+    pairs = [(m["stooq"], m.get("yahoo", m["stooq"])) for m in ASSETS[region].values() if "stooq" in m]
+    return sum(df is not None for df in get_price_series_batch(pairs).values())
 
-@st.cache_data(ttl=int(TTL["fred_quarterly"].total_seconds()))
-def _buffett_cached():
-    return compute_buffett_indicator()
 
-@st.cache_data(ttl=int(TTL["stooq_daily"].total_seconds()))
-def _trend_cached(pref, fallback):
-    return compute_asset_trend(pref, fallback)
+def valuation_lens(metrics) -> str:
+    # Valuation lens uses the first five; sentiment is kept but lower weight
+    codes = [COLOR_CODES.get(metrics[k]["color"], COLOR_CODES["grey"]) for k in ("pe", "cape", "buffett", "margin", "conc")]
+    val_score = COLOR_SCORES[codes].mean()
+    return "green" if val_score < 0.67 else ("yellow" if val_score < 1.34 else "red")
 
 
-def color_to_score(color: str) -> int:
-    return {"green": 0, "yellow": 1, "red": 2, "grey": 1}.get(color, 1)
+# Vega-Lite spec for date/value line charts, emitted directly (no Altair spec build per chart)
+_LINE_SPEC = {
+    "mark": "line",
+    "encoding": {
+        "x": {"field": "date", "type": "temporal"},
+        "y": {"field": "value", "type": "quantitative"},
+    },
+}
 
 
 if page == "Market Overview":
@@ -73,12 +113,9 @@ if page == "Market Overview":
     col1, col2, col3 = st.columns(3)
     col4, col5, col6 = st.columns(3)
 
-    pe = _ttm_pe_cached()
-    cape = _cape_cached()
-    buffett = _buffett_cached()
-    margin = _margin_cached()
-    conc = _concentration_cached()
-    sent = _sentiment_cached()
+    metrics = _load_all()
+    pe, cape, buffett = metrics["pe"], metrics["cape"], metrics["buffett"]
+    margin, conc, sent = metrics["margin"], metrics["conc"], metrics["sent"]
 
     with col1:
         series_tile("S&P 500 TTM P/E", pe, "{:.1f}")
@@ -103,10 +140,7 @@ if page == "Market Overview":
         series_tile("Sentiment (Greed proxy 0–100)", sent, "{:.0f}")
 
     # Overall strip
-    valuation_colors = [pe["color"], cape["color"], buffett["color"], margin["color"], conc["color"], sent["color"]]
-    # Valuation lens uses the first five; sentiment is kept but lower weight
-    val_score = np.mean([color_to_score(c) for c in [pe["color"], cape["color"], buffett["color"], margin["color"], conc["color"]]])
-    valuation_color = "green" if val_score < 0.67 else ("yellow" if val_score < 1.34 else "red")
+    valuation_color = valuation_lens(metrics)
 
     # Trend lens = S&P 500 default
     trend = _trend_cached("^spx", "^GSPC")
@@ -117,13 +151,13 @@ if page == "Market Overview":
     st.divider()
     st.subheader("Data Health")
     data_health([
-        {"name":"TTM P/E","last":pe.get("last_updated"),"source":pe.get("source"),"value":pe.get("value")},
-        {"name":"CAPE","last":cape.get("last_updated"),"source":cape.get("source"),"value":cape.get("value")},
-        {"name":"Buffett","last":buffett.get("last_updated"),"source":buffett.get("source"),"value":buffett.get("value")},
-        {"name":"Margin debt YoY","last":margin.get("last_updated"),"source":margin.get("source"),"value":margin.get("value")},
-        {"name":"SPY Top-10","last":conc.get("last_updated"),"source":conc.get("source"),"value":conc.get("value")},
-        {"name":"Sentiment proxy","last":sent.get("last_updated"),"source":sent.get("source"),"value":sent.get("value")},
-    ])
+        {"name":"TTM P/E","last":pe.get("last_updated"),"source":pe.get("source"),"value":pe.get("value"),"status":pe.get("status")},
+        {"name":"CAPE","last":cape.get("last_updated"),"source":cape.get("source"),"value":cape.get("value"),"status":cape.get("status")},
+        {"name":"Buffett","last":buffett.get("last_updated"),"source":buffett.get("source"),"value":buffett.get("value"),"status":buffett.get("status")},
+        {"name":"Margin debt YoY","last":margin.get("last_updated"),"source":margin.get("source"),"value":margin.get("value"),"status":margin.get("status")},
+        {"name":"SPY Top-10","last":conc.get("last_updated"),"source":conc.get("source"),"value":conc.get("value"),"status":conc.get("status")},
+        {"name":"Sentiment proxy","last":sent.get("last_updated"),"source":sent.get("source"),"value":sent.get("value"),"status":sent.get("status")},
+    ], source_stats=source_cache_stats())
 
 
 elif page == "Asset Browser":
@@ -138,16 +172,20 @@ elif page == "Asset Browser":
 
     if "fred" in meta:
         # Simple plot from FRED series
-        import altair as alt
         from data_sources import fred_series
         df = fred_series(meta["fred"])
         if df is None:
             st.warning("No data available from FRED.")
         else:
-            st.altair_chart(alt.Chart(df).mark_line().encode(x="date:T", y="value:Q"), use_container_width=True)
+            df = downsample_lttb(df.set_index("date")["value"]).reset_index()
+            st.vega_lite_chart(df, _LINE_SPEC, use_container_width=True)
     elif "coingecko" in meta:
         from data_sources import coingecko_markets
-        df = coingecko_markets([meta["coingecko"]])
+        # One batched request for every configured coin, so switching coins is a cache hit
+        coin_ids = [sym for _, _, provider, sym in ASSETS_FLAT if provider == "coingecko"]
+        df = coingecko_markets(coin_ids)
+        if df is not None and "id" in df.columns:
+            df = df[df["id"] == meta["coingecko"]]
         if df is None or df.empty:
             st.warning("No data from CoinGecko.")
         else:
@@ -157,17 +195,15 @@ elif page == "Asset Browser":
             with cols[1]: st.metric("24h %", f"{item['price_change_percentage_24h']:.2f}%")
             with cols[2]: st.metric("7d %", f"{item['price_change_percentage_7d_in_currency']:.2f}%")
     else:
+        _warm_region(region)
         trend = _trend_cached(pref, fallback)
         price_panel(instrument, trend)
 
 elif page == "Valuation Detail":
     st.subheader("Valuation Metrics")
-    pe = compute_ttm_pe()
-    cape = compute_cape()
-    buffett = compute_buffett_indicator()
-    margin = compute_margin_debt_yoy()
-    conc = compute_concentration_top10()
-    sent = compute_sentiment_proxy()
+    metrics = _load_all()
+    pe, cape, buffett = metrics["pe"], metrics["cape"], metrics["buffett"]
+    margin, conc, sent = metrics["margin"], metrics["conc"], metrics["sent"]
 
     def plot_series(title, dct, fmt):
         series = dct.get("series")
@@ -176,10 +212,10 @@ elif page == "Valuation Detail":
         if series is None or series.empty:
             st.warning(f"{title}: no data")
             return
-        import altair as alt
-        df = series.to_frame(name="value").reset_index()
+        # Long histories (150+ years monthly, decades daily) are thinned to what the chart can show
+        df = downsample_lttb(series).to_frame(name="value").reset_index()
         st.markdown(f"**{title}** — current: {fmt.format(value) if value is not None else '—'}  \n*Source: {source}*")
-        st.altair_chart(alt.Chart(df).mark_line().encode(x="date:T", y="value:Q"), use_container_width=True)
+        st.vega_lite_chart(df, _LINE_SPEC, use_container_width=True)
 
     plot_series("S&P 500 TTM P/E", pe, "{:.1f}")
     plot_series("Shiller CAPE", cape, "{:.1f}")
@@ -198,20 +234,13 @@ elif page == "Valuation Detail":
 
 elif page == "Signals":
     st.subheader("Signals")
-    pe = compute_ttm_pe()
-    cape = compute_cape()
-    buffett = compute_buffett_indicator()
-    margin = compute_margin_debt_yoy()
-    conc = compute_concentration_top10()
-    sent = compute_sentiment_proxy()
-    trend = compute_asset_trend("^spx", "^GSPC")
+    metrics = _load_all()
+    pe, cape, buffett = metrics["pe"], metrics["cape"], metrics["buffett"]
+    margin, conc, sent = metrics["margin"], metrics["conc"], metrics["sent"]
+    trend = _trend_cached("^spx", "^GSPC")
 
     # Valuation and trend composite
-    def color_to_score(color: str) -> int:
-        return {"green": 0, "yellow": 1, "red": 2, "grey": 1}.get(color, 1)
-
-    val_score = np.mean([color_to_score(c) for c in [pe["color"], cape["color"], buffett["color"], margin["color"], conc["color"]]])
-    valuation_color = "green" if val_score < 0.67 else ("yellow" if val_score < 1.34 else "red")
+    valuation_color = valuation_lens(metrics)
     trend_color = trend.get("trend_color", "yellow")
 
     st.metric("Valuation lens", valuation_color.title())
@@ -233,6 +262,12 @@ elif page == "Sources":
 - **Treasury yields:** FRED CSV (2Y/10Y)  
 - **Crypto:** CoinGecko public API  
 """)
+    with st.expander("Cache diagnostics (this session)"):
+        stats = st.session_state.get(_CACHE_STATS_KEY)
+        if stats:
+            st.dataframe(pd.DataFrame(list(stats)))
+        else:
+            st.caption("No cached calls recorded yet in this session.")
 
 st.markdown("---")
 st.caption("© 2025 · Built with Streamlit. """)
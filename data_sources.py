@@ -1,60 +1,338 @@
 
 # data_sources.py
 import io
+import os
+import json
 import time
+import hashlib
+import functools
+import threading
 import zipfile
 import warnings
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Optional, Tuple, Dict
+from typing import Callable, Optional, Sequence, Tuple, Dict, List
 
 import numpy as np
 import pandas as pd
 import requests
+import streamlit as st
 
-from settings import TTL, CBOE_VIX_CSV, CBOE_PUTCALL_CSV, FRED_SERIES_CSV, FINRA_MARGIN_CANDIDATES, SHILLER_XLS, SPY_HOLDINGS_CSV, LOCAL_WILSHIRE_CSV
+from settings import TTL_SECONDS, CBOE_VIX_CSV, CBOE_PUTCALL_CSV, FRED_SERIES_CSV, FINRA_MARGIN_CANDIDATES, SHILLER_XLS, SPY_HOLDINGS_CSV, LOCAL_WILSHIRE_CSV, HTTP_CACHE_DIR, DISK_CACHE_DIR, STALE_FALLBACK_TTL, STALE_RETRY_TTL, HTTP_CACHE_RETENTION, STOOQ_CSV
 
 USER_AGENT = {"User-Agent": "Mozilla/5.0 (compatible; MacroDashboardBot/1.0)"}
 
+# Typed schema for Stooq/Yahoo OHLC downloads: parsed by the Arrow CSV reader, prices kept as float32.
+# Volume is float64 so blank cells become NaN instead of failing an integer cast.
+OHLC_CSV_OPTIONS = {
+    "engine": "pyarrow",
+    "dtype": {**{c: np.float32 for c in ("Open", "High", "Low", "Close", "Adj Close")}, "Volume": np.float64},
+    "parse_dates": ["Date"],
+}
+
+# Shared session: keeps connections alive across fetches to the same host
+_session = requests.Session()
+_session.headers.update(USER_AGENT)
+
+
+def _ttl(key: str) -> int:
+    return TTL_SECONDS[key]
+
+
+_cache_call = threading.local()
+
+
+def instrumented_cache(ttl: int, on_call: Callable[[object, bool, float], None],
+                       refresh: Optional[Callable[[object], bool]] = None, show_spinner: bool = True):
+    """
+    st.cache_data(ttl=ttl) that reports every call as on_call(result, miss, seconds), miss being True when
+    the wrapped function actually ran. If refresh(result) is true, the entry is dropped and recomputed once.
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def fill(*args, **kwargs):
+            _cache_call.misses[-1] = True  # only runs when st.cache_data has no fresh entry
+            return fn(*args, **kwargs)
+
+        cached = st.cache_data(ttl=ttl, show_spinner=show_spinner)(fill)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # One flag per call on a per-thread stack, so cached calls nested inside a miss keep their own
+            misses = _cache_call.__dict__.setdefault("misses", [])
+            misses.append(False)
+            t0 = time.perf_counter()
+            try:
+                result = cached(*args, **kwargs)
+                if refresh is not None and refresh(result):
+                    cached.clear(*args, **kwargs)
+                    result = cached(*args, **kwargs)
+            finally:
+                miss = misses.pop()
+            on_call(result, miss, time.perf_counter() - t0)
+            return result
+        wrapper.clear = cached.clear
+        return wrapper
+    return deco
+
+
+# Process-wide hit/miss counters per source getter. Getters run on worker threads (metric and region
+# fan-outs) where st.session_state is unavailable, so these live at module level behind a lock.
+_source_calls: Dict[str, Dict[str, float]] = {}
+_source_calls_lock = threading.Lock()
+
+
+def _record_source_call(name: str, miss: bool, seconds: float) -> None:
+    with _source_calls_lock:
+        counts = _source_calls.setdefault(name, {"hits": 0, "misses": 0, "miss_seconds": 0.0})
+        if miss:
+            counts["misses"] += 1
+            counts["miss_seconds"] += seconds
+        else:
+            counts["hits"] += 1
+
+
+def source_cache_stats() -> List[Dict]:
+    """Hits, misses and seconds spent on misses per source getter, across all sessions since start."""
+    with _source_calls_lock:
+        return [{"func": name, **counts} for name, counts in sorted(_source_calls.items())]
+
+
+def _stale_retry_due(df: Optional[pd.DataFrame]) -> bool:
+    return frame_is_stale(df) and time.time() - df.attrs["stale_at"] > STALE_RETRY_TTL.total_seconds()
+
+
+def source_cache(ttl_key: str):
+    """
+    instrumented_cache(TTL_SECONDS[ttl_key]) for a source getter, counted in source_cache_stats(). A frame
+    parsed from a stale fallback body is only reused for STALE_RETRY_TTL before the upstream is tried again.
+    """
+    def deco(fn):
+        def record(df, miss: bool, seconds: float) -> None:
+            _record_source_call(fn.__name__, miss, seconds)
+        return instrumented_cache(_ttl(ttl_key), record, refresh=_stale_retry_due, show_spinner=False)(fn)
+    return deco
+
+
+def disk_cache(name: str, ttl_key: str):
+    """
+    Persist a getter's parsed DataFrame to DISK_CACHE_DIR/<name>[_<args>].parquet and reuse it
+    while the file is younger than TTL_SECONDS[ttl_key]. Layered under st.cache_data so restarts start warm.
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            stem = "_".join([name, *(str(a) for a in args)])
+            path = os.path.join(DISK_CACHE_DIR, f"{stem}.parquet")
+            try:
+                if time.time() - os.path.getmtime(path) < TTL_SECONDS[ttl_key]:
+                    return pd.read_parquet(path)
+            except Exception:
+                pass
+            df = fn(*args)
+            # A frame from a stale fallback body is never persisted: after a restart it would pass as fresh
+            if df is not None and not frame_is_stale(df):
+                try:
+                    os.makedirs(DISK_CACHE_DIR, exist_ok=True)
+                    tmp = f"{path}.tmp"
+                    df.to_parquet(tmp, compression="zstd")
+                    os.replace(tmp, path)
+                except Exception as e:
+                    # Frames pyarrow can't store (e.g. mixed-type object columns) skip the disk tier
+                    warnings.warn(f"disk_cache: not persisting {stem}: {e}", RuntimeWarning)
+            return df
+        return wrapper
+    return deco
+
 
 def _utc_now_ts() -> pd.Timestamp:
     # Robust, tz-aware
     return pd.Timestamp.now(tz="UTC")
 
 
-def fetch_csv(url: str, timeout: int = 20) -> Optional[pd.DataFrame]:
+# Query parameters that change on every request (Yahoo's period2=now) and must not split the cache key
+_VOLATILE_PARAMS = frozenset({"period2"})
+
+
+def _http_cache_key(url: str) -> str:
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in _VOLATILE_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _http_cache_paths(url: str) -> Tuple[str, str]:
+    key = hashlib.sha1(_http_cache_key(url).encode("utf-8")).hexdigest()
+    base = os.path.join(HTTP_CACHE_DIR, key)
+    return base + ".body", base + ".json"
+
+
+def _http_cache_prune() -> None:
+    # Drop entries past HTTP_CACHE_RETENTION. A body too old to serve stale is still kept until then,
+    # so a 30-day source can send its validators and get a 304 instead of a full download
+    cutoff = time.time() - HTTP_CACHE_RETENTION.total_seconds()
+    try:
+        with os.scandir(HTTP_CACHE_DIR) as entries:
+            old = [e.path for e in entries if e.name.endswith(".body") and e.stat().st_mtime < cutoff]
+        for body_path in old:
+            for path in (body_path, body_path[:-len(".body")] + ".json"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    except OSError:
+        pass
+
+
+def _http_cache_store(url: str, r: requests.Response) -> None:
+    # Every good body is kept: validators enable 304 revalidation, the body itself backs the stale fallback
+    meta = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+    body_path, meta_path = _http_cache_paths(url)
+    try:
+        os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+        _http_cache_prune()
+        # Write body first, then metadata, each atomically; a torn pair just means a full re-download
+        for path, payload in ((body_path, r.content), (meta_path, json.dumps(meta).encode("utf-8"))):
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _http_cache_stale_body(url: str) -> Optional[bytes]:
+    # Last good body, if it was fetched or revalidated within STALE_FALLBACK_TTL
+    body_path, _ = _http_cache_paths(url)
+    try:
+        if time.time() - os.path.getmtime(body_path) > STALE_FALLBACK_TTL.total_seconds():
+            return None
+        with open(body_path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+# Cache key (_http_cache_key) -> time it was last served from the stale fallback; cleared on the next good response
+_stale_urls: Dict[str, float] = {}
+
+
+def is_stale(*urls: str) -> bool:
+    """True if any of these URLs is currently being served from its stale on-disk copy."""
+    return any(_http_cache_key(u) in _stale_urls for u in urls)
+
+
+def tag_stale(df: Optional[pd.DataFrame], *urls: str) -> Optional[pd.DataFrame]:
+    # A frame parsed from a stale fallback body carries the time in attrs["stale_at"], so its status
+    # travels with it (through st.cache_data too) instead of depending on which URL was fetched last
+    if df is not None and is_stale(*urls):
+        df.attrs["stale_at"] = time.time()
+    return df
+
+
+def frame_is_stale(df: Optional[pd.DataFrame]) -> bool:
+    return df is not None and "stale_at" in df.attrs
+
+
+def http_get(url: str, timeout: int = 20, parse: Optional[Callable[[bytes], object]] = None):
+    """
+    GET with on-disk ETag / Last-Modified revalidation.
+    Unchanged upstream files come back as a 304 and are served from HTTP_CACHE_DIR.
+    With parse, returns parse(body) instead of the bytes, and a new body is only written to the cache once
+    parse accepts it (returns non-None), so an error page served with a 200 never replaces the last good copy.
+    If the upstream is down or its body is rejected, the last good copy (up to STALE_FALLBACK_TTL old) is
+    served instead and flagged via is_stale(); without such a copy the error is raised.
+    """
+    accept = parse or (lambda body: body)
+    body_path, meta_path = _http_cache_paths(url)
+    headers = {}
     try:
-        r = requests.get(url, headers=USER_AGENT, timeout=timeout)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if os.path.exists(body_path):
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+    except (OSError, ValueError):
+        pass
+    try:
+        r = _session.get(url, headers=headers, timeout=timeout)
+        if r.status_code == 304 and headers:
+            try:
+                with open(body_path, "rb") as f:
+                    body = f.read()
+            except OSError:
+                # Cached body vanished under us; refetch unconditionally
+                r = _session.get(url, timeout=timeout)
+            else:
+                try:
+                    os.utime(body_path)  # revalidated: restart the stale-fallback clock
+                except OSError:
+                    pass
+                _stale_urls.pop(_http_cache_key(url), None)
+                return accept(body)
         r.raise_for_status()
-        buf = io.StringIO(r.text)
-        df = pd.read_csv(buf)
+        result = accept(r.content)
+        if result is None:
+            raise ValueError(f"unusable response body from {url}")
+    except Exception:
+        # Network/HTTP error or a body the caller's parser rejected
+        body = _http_cache_stale_body(url)
+        if body is None:
+            raise
+        result = accept(body)
+        _stale_urls[_http_cache_key(url)] = time.time()
+        return result
+    _stale_urls.pop(_http_cache_key(url), None)
+    _http_cache_store(url, r)
+    return result
+
+
+def fetch_csv(url: str, timeout: int = 20, required: Sequence[str] = (), **read_kwargs) -> Optional[pd.DataFrame]:
+    # required: columns a good download must have; anything else (e.g. a rate-limit notice) is not cached
+    def parse(content: bytes) -> pd.DataFrame:
+        # Hand raw bytes to the parser; avoids decoding the whole body to str first
+        try:
+            df = pd.read_csv(io.BytesIO(content), **read_kwargs)
+        except pd.errors.ParserError:
+            if read_kwargs.get("engine") != "pyarrow":
+                raise
+            # The Arrow reader rejects ragged rows (e.g. old rows without Volume); the C parser pads them with NaN
+            df = pd.read_csv(io.BytesIO(content), **{**read_kwargs, "engine": "c"})
+        missing = set(required).difference(df.columns)
+        if missing:
+            raise ValueError(f"{url}: missing columns {sorted(missing)}")
         return df
-    except Exception as e:
+    try:
+        return http_get(url, timeout=timeout, parse=parse)
+    except Exception:
         return None
 
 
-def fetch_binary(url: str, timeout: int = 30) -> Optional[bytes]:
+def fetch_binary(url: str, timeout: int = 30, parse: Optional[Callable[[bytes], object]] = None):
+    # Raw bytes, or parse(bytes) when given (see http_get); None on failure
     try:
-        r = requests.get(url, headers=USER_AGENT, timeout=timeout)
-        r.raise_for_status()
-        return r.content
+        return http_get(url, timeout=timeout, parse=parse)
     except Exception:
         return None
 
 
+@source_cache("stooq_daily")
 def stooq_history(symbol: str, interval: str = "d") -> Optional[pd.DataFrame]:
     """
     Fetch historical data from Stooq. interval in {'d','w','m'}
     Returns DataFrame with columns: Date, Open, High, Low, Close, Volume
     """
-    base = f"https://stooq.com/q/d/l/?s={symbol}&i={interval}"
-    df = fetch_csv(base)
-    if df is None or "Date" not in df.columns:
+    base = STOOQ_CSV.format(symbol=symbol, interval=interval)
+    df = fetch_csv(base, required=("Date", "Close"), **OHLC_CSV_OPTIONS)
+    if df is None:
         return None
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
     df = df.dropna(subset=["Date"]).sort_values("Date")
-    return df.rename(columns=str.lower)
+    return tag_stale(df.rename(columns=str.lower), base)
 
 
+@source_cache("stooq_daily")
 def yahoo_history(symbol: str, period: str = "max", interval: str = "1d") -> Optional[pd.DataFrame]:
     """
     Fallback via Yahoo's 'query1.finance.yahoo.com' CSV style endpoint (no yfinance dependency).
@@ -64,20 +342,21 @@ def yahoo_history(symbol: str, period: str = "max", interval: str = "1d") -> Opt
         period1 = 0
         period2 = int(time.time())
         url = f"https://query1.finance.yahoo.com/v7/finance/download/{symbol}?period1={period1}&period2={period2}&interval={interval}&events=history&includeAdjustedClose=true"
-        df = fetch_csv(url)
-        if df is None or "Date" not in df.columns:
+        df = fetch_csv(url, required=("Date", "Close"), **OHLC_CSV_OPTIONS)
+        if df is None:
             return None
-        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
         df = df.dropna(subset=["Date"]).sort_values("Date")
         df = df.rename(columns={"Adj Close": "AdjClose"})
-        return df.rename(columns=str.lower)
+        return tag_stale(df.rename(columns=str.lower), url)
     except Exception:
         return None
 
 
+@source_cache("treasury_daily")
+@disk_cache("fred", "treasury_daily")
 def fred_series(series_id: str) -> Optional[pd.DataFrame]:
     url = FRED_SERIES_CSV.format(sid=series_id)
-    df = fetch_csv(url)
+    df = fetch_csv(url, required=("DATE", series_id))
     if df is None:
         return None
     # Standardize
@@ -86,9 +365,10 @@ def fred_series(series_id: str) -> Optional[pd.DataFrame]:
     # Some FRED series have '.' missing values
     df["value"] = pd.to_numeric(df["value"], errors="coerce")
     df = df.dropna(subset=["value"]).sort_values("date")
-    return df
+    return tag_stale(df, url)
 
 
+@source_cache("cboe_daily")
 def cboe_vix() -> Optional[pd.DataFrame]:
     df = fetch_csv(CBOE_VIX_CSV)
     if df is None:
@@ -99,9 +379,10 @@ def cboe_vix() -> Optional[pd.DataFrame]:
     if "date" in df.columns:
         df["date"] = pd.to_datetime(df["date"], errors="coerce")
         df = df.dropna(subset=["date"]).sort_values("date")
-    return df
+    return tag_stale(df, CBOE_VIX_CSV)
 
 
+@source_cache("cboe_daily")
 def cboe_putcall() -> Optional[pd.DataFrame]:
     df = fetch_csv(CBOE_PUTCALL_CSV)
     if df is None:
@@ -111,38 +392,51 @@ def cboe_putcall() -> Optional[pd.DataFrame]:
     if "date" in df.columns:
         df["date"] = pd.to_datetime(df["date"], errors="coerce")
         df = df.dropna(subset=["date"]).sort_values("date")
-    return df
+    return tag_stale(df, CBOE_PUTCALL_CSV)
+
+
+def _parse_finra(content: bytes) -> Optional[pd.DataFrame]:
+    df = pd.read_excel(io.BytesIO(content), engine="calamine")
+    # Try to infer the columns (FINRA sheet is usually wide; we search for "Customer debit balances"
+    df.columns = df.columns.astype(str).str.strip()
+    # Melt if necessary
+    if "Date" not in df.columns and "Month" in df.columns:
+        df.rename(columns={"Month": "Date"}, inplace=True)
+    if "Date" not in df.columns:
+        return None
+    # Choose the column that contains "Customer debit balances"
+    cols = df.columns.str.lower()
+    matches = df.columns[cols.str.contains("debit") & cols.str.contains("balances")]
+    if not len(matches):
+        return None
+    out = df.loc[:, ["Date", matches[0]]].set_axis(["date", "margin_debt"], axis=1)
+    out["date"] = pd.to_datetime(out["date"], errors="coerce")
+    return out.dropna().sort_values("date")
+
 
+def _fetch_finra_candidate(url: str) -> Tuple[Optional[pd.DataFrame], bool]:
+    # Parsed frame plus whether it came from the stale fallback, read on the thread that fetched it
+    df = fetch_binary(url, parse=_parse_finra)
+    return df, is_stale(url)
 
+
+@source_cache("finra_monthly")
+@disk_cache("finra_margin_debt", "finra_monthly")
 def finra_margin_debt() -> Optional[pd.DataFrame]:
-    for url in FINRA_MARGIN_CANDIDATES:
-        content = fetch_binary(url)
-        if content:
-            try:
-                df = pd.read_excel(io.BytesIO(content))
-                # Try to infer the columns (FINRA sheet is usually wide; we search for "Customer debit balances"
-                df.columns = [str(c).strip() for c in df.columns]
-                # Melt if necessary
-                if "Date" not in df.columns and "Month" in df.columns:
-                    df.rename(columns={"Month": "Date"}, inplace=True)
-                if "Date" in df.columns:
-                    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-                    # Choose the column that contains "Customer debit balances"
-                    target = None
-                    for c in df.columns:
-                        if "debit" in c.lower() and "balances" in c.lower():
-                            target = c
-                            break
-                    if target:
-                        out = df[["Date", target]].dropna()
-                        out.columns = ["date", "margin_debt"]
-                        out = out.sort_values("date")
-                        return out
-            except Exception:
-                continue
+    # Probe all candidates concurrently (cold latency = slowest URL, not the sum)
+    with ThreadPoolExecutor(max_workers=len(FINRA_MARGIN_CANDIDATES)) as ex:
+        results = list(ex.map(_fetch_finra_candidate, FINRA_MARGIN_CANDIDATES))
+    # Any fresh download beats a stale fallback copy; within each group prefer the listed order
+    for df, stale in sorted(results, key=lambda res: res[1]):
+        if df is not None:
+            if stale:
+                df.attrs["stale_at"] = time.time()
+            return df
     return None
 
 
+@source_cache("holdings_daily")
+@disk_cache("spy_holdings", "holdings_daily")
 def spy_holdings() -> Optional[pd.DataFrame]:
     df = fetch_csv(SPY_HOLDINGS_CSV)
     if df is None:
@@ -154,60 +448,80 @@ def spy_holdings() -> Optional[pd.DataFrame]:
     # SPY uses "weight" as percentage; ensure numeric
     if "weight" in df.columns:
         df["weight"] = pd.to_numeric(df["weight"], errors="coerce") / 100.0
-    return df
+    return tag_stale(df, SPY_HOLDINGS_CSV)
+
 
+def _shiller_month_dates(values: pd.Series) -> pd.Series:
+    # Dates are YYYY.MM decimals (1871.01 = Jan, 1871.1 = Oct); decode year/month in one vectorized pass
+    x = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+    year = np.floor(x)
+    month = np.clip(np.round((x - year) * 100), 1, 12)
+    dates = pd.to_datetime(pd.DataFrame({"year": year, "month": month, "day": 1}), errors="coerce")
+    return dates.dt.tz_localize("UTC").set_axis(values.index)
 
+
+def _parse_shiller(content: bytes) -> Optional[pd.DataFrame]:
+    df = pd.read_excel(io.BytesIO(content), sheet_name="Data", skiprows=7, engine="calamine")
+    # The sheet usually has columns: Date, P, D, E, CPI, etc.
+    # Try to standardize
+    df.columns = [str(c).strip() for c in df.columns]
+    if "Date" in df.columns:
+        df["date"] = _shiller_month_dates(df["Date"])
+    else:
+        # Fallback: use index as date if possible
+        df["date"] = pd.to_datetime(df.iloc[:, 0], errors="coerce")
+    # Standardize key columns, one source column each: nominal P/E before the real Price/Earnings
+    # columns, plain CAPE before TR CAPE (duplicate names would also keep the frame out of Parquet)
+    by_lower = {c.lower(): c for c in reversed(df.columns)}  # first occurrence wins
+    colmap = {}
+    for name, aliases in (("price", ("p", "price")), ("earnings", ("e", "earnings")), ("cape", ("cape",))):
+        src = next((by_lower[a] for a in aliases if a in by_lower), None)
+        if src is None and name == "cape":
+            src = next((c for c in df.columns if "cape" in c.lower()), None)
+        if src is not None:
+            colmap[src] = name
+    df = df.rename(columns=colmap)[["date", *colmap.values()]]
+    # Early CAPE rows are text ("NA"); coerce so the columns are plain floats
+    df[list(colmap.values())] = df[list(colmap.values())].apply(pd.to_numeric, errors="coerce")
+    df = df.dropna(subset=["date"]).sort_values("date")
+    return df if len(df) else None
+
+
+@source_cache("shiller_monthly")
+@disk_cache("shiller", "shiller_monthly")
 def shiller_dataset() -> Optional[pd.DataFrame]:
-    content = fetch_binary(SHILLER_XLS)
-    if not content:
-        return None
-    try:
-        df = pd.read_excel(io.BytesIO(content), sheet_name="Data", skiprows=7)
-        # The sheet usually has columns: Date, P, D, E, CPI, etc.
-        # Try to standardize
-        df.columns = [str(c).strip() for c in df.columns]
-        if "Date" in df.columns:
-            # Dates are monthly decimals like 1871.01; use pd.to_datetime with format if possible
-            # Convert fractional year to month
-            def yearfrac_to_ts(x):
-                try:
-                    year = int(x)
-                    month = int(round((x - year) * 12)) + 1
-                    month = min(max(month, 1), 12)
-                    return pd.Timestamp(year=year, month=month, day=1, tz="UTC")
-                except Exception:
-                    return pd.NaT
-            df["date"] = df["Date"].apply(yearfrac_to_ts)
-        else:
-            # Fallback: use index as date if possible
-            df["date"] = pd.to_datetime(df.iloc[:, 0], errors="coerce")
-        # Standardize key columns
-        colmap = {}
-        for c in df.columns:
-            lc = c.lower()
-            if lc in ("p", "price"):
-                colmap[c] = "price"
-            elif lc in ("e", "earnings"):
-                colmap[c] = "earnings"
-            elif "cape" in lc:
-                colmap[c] = "cape"
-        df = df.rename(columns=colmap)
-        df = df.dropna(subset=["date"]).sort_values("date")
-        return df
-    except Exception:
-        return None
+    return tag_stale(fetch_binary(SHILLER_XLS, parse=_parse_shiller), SHILLER_XLS)
+
+
+COINGECKO_PAGE_SIZE = 250  # /coins/markets per_page maximum
 
 
+def _coingecko_page(ids, vs_currency: str) -> Optional[list]:
+    ids_param = ",".join(ids)
+    url = f"https://api.coingecko.com/api/v3/coins/markets?vs_currency={vs_currency}&ids={ids_param}&per_page={COINGECKO_PAGE_SIZE}&price_change_percentage=1h,24h,7d"
+    r = _session.get(url, timeout=20)
+    r.raise_for_status()
+    data = r.json()
+    return data if isinstance(data, list) else None
+
+
+@source_cache("coingecko_live")
 def coingecko_markets(ids, vs_currency="usd") -> Optional[pd.DataFrame]:
+    """
+    Market data for many coins in as few round-trips as possible: one request per 250 ids,
+    with multiple pages fetched concurrently.
+    """
     try:
-        ids_param = ",".join(ids)
-        url = f"https://api.coingecko.com/api/v3/coins/markets?vs_currency={vs_currency}&ids={ids_param}&price_change_percentage=1h,24h,7d"
-        r = requests.get(url, headers=USER_AGENT, timeout=20)
-        r.raise_for_status()
-        data = r.json()
-        if not isinstance(data, list):
+        ids = list(ids)
+        pages = [ids[i:i + COINGECKO_PAGE_SIZE] for i in range(0, len(ids), COINGECKO_PAGE_SIZE)]
+        if len(pages) <= 1:
+            results = [_coingecko_page(ids, vs_currency)]
+        else:
+            with ThreadPoolExecutor(max_workers=len(pages)) as ex:
+                results = list(ex.map(lambda page: _coingecko_page(page, vs_currency), pages))
+        if any(data is None for data in results):
             return None
-        df = pd.DataFrame(data)
+        df = pd.DataFrame([row for data in results for row in data])
         return df
     except Exception:
         return None
@@ -2,13 +2,19 @@
 # indicators.py
 from __future__ import annotations
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Tuple, List
 
 import numpy as np
 import pandas as pd
 
-from settings import THRESHOLDS
-from data_sources import stooq_history, yahoo_history, fred_series, cboe_vix, cboe_putcall, finra_margin_debt, spy_holdings, shiller_dataset
+try:
+    from numba import njit
+except ImportError:  # numba is optional; rolling_rsi falls back to the pandas EWM path
+    njit = None
+
+from settings import THRESHOLDS, LOCAL_WILSHIRE_CSV
+from data_sources import stooq_history, yahoo_history, fred_series, cboe_vix, cboe_putcall, finra_margin_debt, spy_holdings, shiller_dataset, frame_is_stale
 
 # ---------- Utility functions ----------
 
@@ -16,13 +22,102 @@ def pct_rank(series: pd.Series) -> pd.Series:
     return series.rank(pct=True)
 
 
-def rolling_rsi(close: pd.Series, period: int = 14) -> pd.Series:
+def _wilder_rsi(close: np.ndarray, period: int) -> np.ndarray:
+    # Single pass over the prices, carrying Wilder's smoothed gain/loss (EWM with alpha=1/period)
+    n = close.shape[0]
+    out = np.full(n, np.nan)
+    alpha = 1.0 / period
+    up = 0.0
+    down = 0.0
+    for i in range(1, n):
+        delta = close[i] - close[i - 1]
+        gain = delta if delta > 0.0 else 0.0
+        loss = -delta if delta < 0.0 else 0.0
+        if i == 1:
+            up = gain
+            down = loss
+        else:
+            up += alpha * (gain - up)
+            down += alpha * (loss - down)
+        if down > 0.0:
+            out[i] = 100.0 - 100.0 / (1.0 + up / down)
+        elif up > 0.0:
+            out[i] = 100.0
+    return out
+
+
+if njit is not None:
+    _wilder_rsi = njit(cache=True)(_wilder_rsi)
+
+
+# Below this many prices the pandas path is already sub-millisecond; the kernel pays off on long histories
+_RSI_JIT_MIN_LEN = 256
+
+
+def _rsi_pandas(close: pd.Series, period: int) -> pd.Series:
     delta = close.diff()
     up = delta.clip(lower=0).ewm(alpha=1/period, adjust=False).mean()
     down = -delta.clip(upper=0).ewm(alpha=1/period, adjust=False).mean()
-    rs = up / down.replace(0, np.nan)
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
+    rs = up / down  # no losses -> inf -> RSI 100
+    return 100 - (100 / (1 + rs))
+
+
+def rolling_rsi(close: pd.Series, period: int = 14) -> pd.Series:
+    if njit is not None and len(close) >= _RSI_JIT_MIN_LEN:
+        values = close.to_numpy(dtype=np.float64)
+        if not np.isnan(values).any():
+            return pd.Series(_wilder_rsi(values, period), index=close.index)
+    return _rsi_pandas(close, period)
+
+
+def moving_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing simple moving average over a NaN-free array (same as Series.rolling(window).mean()).
+    O(n) via a cumulative sum; the first window-1 entries are NaN.
+    """
+    out = np.full(values.shape[0], np.nan)
+    if values.shape[0] >= window:
+        csum = np.cumsum(values)
+        out[window - 1:] = csum[window - 1:]
+        out[window:] -= csum[:-window]
+        out[window - 1:] /= window
+    return out
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling: positions of n_out points that keep the visual shape
+    of y over x. First and last points are always kept.
+    """
+    n = x.shape[0]
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) anchors the third triangle vertex
+        if i + 2 < edges.shape[0]:
+            avg_x, avg_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def downsample_lttb(series: pd.Series, n_out: int = 1500) -> pd.Series:
+    """Thin a long series to ~n_out points for charting; short series pass through unchanged."""
+    series = series.dropna()
+    if len(series) <= n_out:
+        return series
+    idx = series.index
+    x = idx.asi8 if isinstance(idx, pd.DatetimeIndex) else np.arange(len(series))
+    x = (x - x[0]).astype(np.float64)
+    return series.iloc[lttb_indices(x, series.to_numpy(dtype=np.float64), n_out)]
 
 
 def drawdown(series: pd.Series) -> pd.Series:
@@ -31,45 +126,69 @@ def drawdown(series: pd.Series) -> pd.Series:
     return dd - 1.0  # negative values
 
 
-def traffic_light(value: Optional[float], ranges: Dict[str, Tuple[Optional[float], Optional[float]]], higher_is_richer: bool = True) -> str:
+TRAFFIC_COLORS = ("green", "yellow", "red", "grey")
+COLOR_CODES = {c: i for i, c in enumerate(TRAFFIC_COLORS)}
+# Composite score per color code (grey counts as neutral)
+COLOR_SCORES = np.array([0, 1, 2, 1])
+
+
+@dataclass(frozen=True, slots=True)
+class ThresholdBand:
+    """Upper bounds of the green and yellow bands; open-ended bounds are +inf."""
+    green_hi: float
+    yellow_hi: float
+
+
+def threshold_band(ranges: Dict[str, Tuple[Optional[float], Optional[float]]]) -> ThresholdBand:
+    """Flatten ordered green < yellow < red ranges into a ThresholdBand."""
+    g_hi, y_hi = ranges["green"][1], ranges["yellow"][1]
+    return ThresholdBand(np.inf if g_hi is None else float(g_hi), np.inf if y_hi is None else float(y_hi))
+
+
+THRESHOLDS_FAST = {k: threshold_band(v) for k, v in THRESHOLDS.items()}
+
+
+def traffic_light(value: Optional[float], ranges, higher_is_richer: bool = True) -> str:
     """
-    Given a value and threshold ranges, return 'green' / 'yellow' / 'red' / 'grey'.
+    Given a value and threshold ranges (dict of bands or a precomputed ThresholdBand),
+    return 'green' / 'yellow' / 'red' / 'grey'.
     For metrics where higher implies 'richer' (more overvalued), pass higher_is_richer=True.
     """
     if value is None or np.isnan(value):
         return "grey"
-    # Ranges are absolute; we interpret inclusively on lower bound for yellow/red
-    for color in ("green", "yellow", "red"):
-        lo, hi = ranges[color]
-        if lo is None and hi is None:
-            return color
-        if lo is None and value < hi:
-            return color
-        if hi is None and value >= lo:
-            return color
-        if lo is not None and hi is not None and (value >= lo) and (value < hi):
-            return color
-    return "grey"
+    band = ranges if isinstance(ranges, ThresholdBand) else threshold_band(ranges)
+    if value < band.green_hi:
+        return "green"
+    if value < band.yellow_hi:
+        return "yellow"
+    return "red"
+
+
+# Simple matrix; pairs involving grey fall back to "Neutral"
+_GUIDANCE = {
+    ("green", "green"): "Accumulate",
+    ("green", "yellow"): "Accumulate (scale in)",
+    ("green", "red"): "Neutral / DCA",
+    ("yellow", "green"): "Neutral / DCA",
+    ("yellow", "yellow"): "Neutral",
+    ("yellow", "red"): "Neutral / Trim",
+    ("red", "green"): "Neutral",
+    ("red", "yellow"): "Trim (raise cash)",
+    ("red", "red"): "Trim / Wait",
+}
 
 
 def guidance_label(valuation_color: str, trend_color: str) -> str:
-    # Simple matrix
-    lookup = {
-        ("green", "green"): "Accumulate",
-        ("green", "yellow"): "Accumulate (scale in)",
-        ("green", "red"): "Neutral / DCA",
-        ("yellow", "green"): "Neutral / DCA",
-        ("yellow", "yellow"): "Neutral",
-        ("yellow", "red"): "Neutral / Trim",
-        ("red", "green"): "Neutral",
-        ("red", "yellow"): "Trim (raise cash)",
-        ("red", "red"): "Trim / Wait",
-    }
-    return lookup.get((valuation_color, trend_color), "Neutral")
+    return _GUIDANCE.get((valuation_color, trend_color), "Neutral")
 
 
 # ---------- Valuation metrics ----------
 
+def _source_status(*frames: Optional[pd.DataFrame]) -> Optional[str]:
+    # "STALE" when any source frame behind a metric was parsed from a stale fallback copy
+    return "STALE" if any(frame_is_stale(df) for df in frames) else None
+
+
 def get_price_series(preferred: str, fallback: str) -> Optional[pd.DataFrame]:
     df = stooq_history(preferred)
     if df is None:
@@ -77,6 +196,18 @@ def get_price_series(preferred: str, fallback: str) -> Optional[pd.DataFrame]:
     return df
 
 
+def get_price_series_batch(pairs: List[Tuple[str, str]], max_workers: int = 8) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    Fetch many (preferred, fallback) symbols in one concurrent fan-out, keyed by preferred symbol.
+    Each fetch goes through the cached Stooq/Yahoo getters, so later single-symbol calls are cache hits.
+    """
+    if not pairs:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pairs))) as ex:
+        frames = ex.map(lambda p: get_price_series(*p), pairs)
+        return {pref: df for (pref, _), df in zip(pairs, frames)}
+
+
 def compute_ttm_pe(spx_symbol_stooq: str = "^spx", spx_symbol_yahoo: str = "^GSPC") -> Dict:
     price_df = get_price_series(spx_symbol_stooq, spx_symbol_yahoo)
     shiller_df = shiller_dataset()
@@ -87,21 +218,27 @@ def compute_ttm_pe(spx_symbol_stooq: str = "^spx", spx_symbol_yahoo: str = "^GSP
         # TTM EPS from last 12 months of monthly earnings
         shiller_df = shiller_df.dropna(subset=["earnings", "date"]).copy()
         shiller_df = shiller_df.sort_values("date")
-        shiller_df["year"] = shiller_df["date"].dt.year
-        shiller_df["month"] = shiller_df["date"].dt.month
         # Compute trailing 12-month EPS by summing last 12 monthly 'earnings'
         shiller_df["ttm_eps"] = shiller_df["earnings"].rolling(window=12).sum()
-        # Map monthly TTM EPS to daily price dates by forward fill
-        s = shiller_df.set_index("date")["ttm_eps"].asfreq("MS").ffill()
-        price_df = price_df.set_index("date").sort_index()
-        price_df["ttm_eps"] = s.reindex(price_df.index, method="ffill")
-        price_df["pe_ttm"] = price_df["close"] / price_df["ttm_eps"]
-        series = price_df["pe_ttm"].dropna()
+        # Monthly TTM EPS on a PeriodIndex, carried forward through the latest price month
+        eps = pd.Series(
+            shiller_df["ttm_eps"].to_numpy(),
+            index=pd.PeriodIndex(shiller_df["date"].dt.tz_localize(None), freq="M"),
+        ).dropna()
+        eps = eps[~eps.index.duplicated(keep="last")]
+        price_df = price_df.sort_values("date")
+        price_months = pd.PeriodIndex(price_df["date"], freq="M")
+        if len(eps) and len(price_months):
+            eps = eps.reindex(pd.period_range(eps.index[0], max(eps.index[-1], price_months[-1]), freq="M")).ffill()
+        # One monthly lookup maps TTM EPS onto every daily price
+        pe_ttm = price_df["close"].to_numpy() / eps.reindex(price_months).to_numpy()
+        series = pd.Series(pe_ttm, index=pd.DatetimeIndex(price_df["date"], name="date")).dropna()
         if not series.empty:
             value = float(series.iloc[-1])
             last_ts = series.index[-1]
-    color = traffic_light(value, THRESHOLDS["pe_ttm"], higher_is_richer=True)
-    return {"value": value, "series": series, "color": color, "last_updated": last_ts, "source": "Price: Stooq/Yahoo; Earnings: Yale/Shiller"}
+    color = traffic_light(value, THRESHOLDS_FAST["pe_ttm"], higher_is_richer=True)
+    return {"value": value, "series": series, "color": color, "last_updated": last_ts, "source": "Price: Stooq/Yahoo; Earnings: Yale/Shiller",
+            "status": _source_status(shiller_df, price_df)}
 
 
 def compute_cape() -> Dict:
@@ -114,12 +251,13 @@ def compute_cape() -> Dict:
         if not series.empty:
             value = float(series.iloc[-1])
             last_ts = series.index[-1]
-    color = traffic_light(value, THRESHOLDS["cape"], higher_is_richer=True)
-    return {"value": value, "series": series, "color": color, "last_updated": last_ts, "source": "Yale/Shiller"}
+    color = traffic_light(value, THRESHOLDS_FAST["cape"], higher_is_richer=True)
+    return {"value": value, "series": series, "color": color, "last_updated": last_ts, "source": "Yale/Shiller",
+            "status": _source_status(df)}
 
 
 def compute_margin_debt_yoy() -> Dict:
-    df = finra_margin_debt()
+    df = raw = finra_margin_debt()
     value = None
     series = None
     last_ts = None
@@ -130,8 +268,9 @@ def compute_margin_debt_yoy() -> Dict:
         if not series.empty:
             value = float(series.iloc[-1])
             last_ts = series.index[-1]
-    color = traffic_light(value, THRESHOLDS["margin_yoy"], higher_is_richer=True)
-    return {"value": value, "series": series, "color": color, "last_updated": last_ts, "source": "FINRA"}
+    color = traffic_light(value, THRESHOLDS_FAST["margin_yoy"], higher_is_richer=True)
+    return {"value": value, "series": series, "color": color, "last_updated": last_ts, "source": "FINRA",
+            "status": _source_status(raw)}
 
 
 def compute_concentration_top10() -> Dict:
@@ -140,9 +279,11 @@ def compute_concentration_top10() -> Dict:
     last_ts = None
     series = None
     if df is not None and "weight" in df.columns:
-        df = df.sort_values("weight", ascending=False)
-        top10 = df.head(10)
-        value = float(top10["weight"].sum())
+        w = df["weight"].to_numpy(dtype=np.float64)
+        w = w[~np.isnan(w)]
+        k = min(10, w.size)
+        # O(n) selection of the ten largest weights; no sorted copy of the holdings
+        value = float(np.partition(w, w.size - k)[w.size - k:].sum()) if k else 0.0
         # This CSV sometimes has a "fund_as_of_date" column or similar
         date_col = None
         for c in df.columns:
@@ -154,14 +295,15 @@ def compute_concentration_top10() -> Dict:
                 last_ts = pd.to_datetime(df[date_col].iloc[0], errors="coerce")
             except Exception:
                 last_ts = None
-    color = traffic_light(value, THRESHOLDS["concentration_top10"], higher_is_richer=True)
-    return {"value": value, "series": series, "color": color, "last_updated": last_ts, "source": "State Street (SPY holdings)"}
+    color = traffic_light(value, THRESHOLDS_FAST["concentration_top10"], higher_is_richer=True)
+    return {"value": value, "series": series, "color": color, "last_updated": last_ts, "source": "State Street (SPY holdings)",
+            "status": _source_status(df)}
 
 
 def compute_sentiment_proxy() -> Dict:
-    vix = cboe_vix()
-    pcr = cboe_putcall()
-    hy = fred_series("BAMLH0A0HYM2")
+    vix = vix_raw = cboe_vix()
+    pcr = pcr_raw = cboe_putcall()
+    hy = hy_raw = fred_series("BAMLH0A0HYM2")
 
     value = None
     last_ts = None
@@ -185,34 +327,32 @@ def compute_sentiment_proxy() -> Dict:
 
         hy = hy.set_index("date")["value"].astype(float).dropna()
 
-        # Align index
-        df = pd.DataFrame(index=vix.index.union(pcr_series.index).union(hy.index))
-        df["vix"] = vix.reindex(df.index).ffill()
-        df["pcr"] = pcr_series.reindex(df.index).ffill()
-        df["hy_oas"] = hy.reindex(df.index).ffill()
+        # Align index (single outer-join pass, then carry values forward)
+        df = pd.concat({"vix": vix, "pcr": pcr_series, "hy_oas": hy}, axis=1).sort_index().ffill()
 
-        # Recent window
-        recent = df.last("1825D")
+        # Recent window (last 5 years)
+        recent = df[df.index > df.index.max() - pd.Timedelta(days=1825)]
         if recent.empty:
             recent = df.dropna()
+        recent = recent.astype(np.float32)
 
         # Percentiles: higher VIX/pcr/hy_oas = more fear => map to low "sentiment score"
-        vix_pct = recent["vix"].rank(pct=True)
-        pcr_pct = recent["pcr"].rank(pct=True)
-        hy_pct = recent["hy_oas"].rank(pct=True)
+        # One column-wise rank over the aligned frame, then plain float32 array arithmetic
+        ranks = recent[["vix", "pcr", "hy_oas"]].rank(pct=True).to_numpy(dtype=np.float32)
 
         # Momentum proxy via RSP/SPY ratio is not here; keep it to 3 subcomponents (equal weights)
-        fear_quantile = (vix_pct + pcr_pct + hy_pct) / 3.0  # 0 (calm/greed) .. 1 (fear)
+        fear_quantile = ranks.mean(axis=1)  # 0 (calm/greed) .. 1 (fear)
         # Turn into "greed score" 0..100 (like CNN, high=greed)
         greed_score = (1.0 - fear_quantile) * 100.0
 
-        series = greed_score
+        series = pd.Series(greed_score, index=recent.index)
         if not series.empty:
             value = float(series.iloc[-1])
             last_ts = series.index[-1]
 
-    color = traffic_light(value, THRESHOLDS["sentiment"], higher_is_richer=True)  # higher greed = 'richer' (red)
-    return {"value": value, "series": series, "color": color, "last_updated": last_ts, "source": "CBOE (VIX, Put/Call), FRED (HY OAS) — proxy"}
+    color = traffic_light(value, THRESHOLDS_FAST["sentiment"], higher_is_richer=True)  # higher greed = 'richer' (red)
+    return {"value": value, "series": series, "color": color, "last_updated": last_ts, "source": "CBOE (VIX, Put/Call), FRED (HY OAS) — proxy",
+            "status": _source_status(vix_raw, pcr_raw, hy_raw)}
 
 
 def compute_buffett_indicator() -> Dict:
@@ -220,39 +360,36 @@ def compute_buffett_indicator() -> Dict:
     # Expect CSV with columns: date, wilshire_index_level, nominal_gdp (quarterly)
     value = None; series = None; last_ts = None; src = "Local proxy (Wilshire+GDP)"
     try:
-        df = pd.read_csv(LOCAL_WILSHIRE_CSV)
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        df = df.dropna(subset=["date"]).sort_values("date")
+        df = pd.read_csv(LOCAL_WILSHIRE_CSV, parse_dates=["date"])
+        df.columns = df.columns.str.lower()
         # Compute ratio scaled to ~1.x (market cap / GDP)
         # Assume columns: market_cap and gdp
-        col_map = {c.lower(): c for c in df.columns}
-        cap_col = col_map.get("market_cap") or col_map.get("wilshire") or col_map.get("total_market_cap")
-        gdp_col = col_map.get("gdp") or col_map.get("nominal_gdp")
+        cap_col = next((c for c in ("market_cap", "wilshire", "total_market_cap") if c in df.columns), None)
+        gdp_col = next((c for c in ("gdp", "nominal_gdp") if c in df.columns), None)
         if cap_col and gdp_col:
-            df["ratio"] = df[cap_col].astype(float) / df[gdp_col].astype(float)
-            series = df.set_index("date")["ratio"]
+            ratio = (df[cap_col] / df[gdp_col]).astype(np.float32)
+            series = pd.Series(ratio.to_numpy(), index=pd.DatetimeIndex(df["date"], name="date")).sort_index().dropna()
             value = float(series.iloc[-1])
             last_ts = series.index[-1]
     except Exception:
         pass
-    color = traffic_light(value, THRESHOLDS["buffett"], higher_is_richer=True)
+    color = traffic_light(value, THRESHOLDS_FAST["buffett"], higher_is_richer=True)
     return {"value": value, "series": series, "color": color, "last_updated": last_ts, "source": src}
 
 
 # ---------- Trend lens (per asset) ----------
 
 def compute_asset_trend(preferred: str, fallback: str) -> Dict:
-    price_df = stooq_history(preferred)
-    if price_df is None:
-        price_df = yahoo_history(fallback)
+    price_df = get_price_series(preferred, fallback)
     if price_df is None or price_df.empty:
         return {"error": "No price data", "series": None}
     df = price_df.set_index("date").sort_index()
     close = df["close"].dropna()
-    sma50 = close.rolling(50).mean()
-    sma200 = close.rolling(200).mean()
+    c = close.to_numpy(dtype=np.float64)
+    sma50 = pd.Series(moving_mean(c, 50), index=close.index)
+    sma200 = pd.Series(moving_mean(c, 200), index=close.index)
     rsi = rolling_rsi(close, 14)
-    dd = (close / close.cummax()) - 1.0
+    dd = pd.Series(c / np.maximum.accumulate(c) - 1.0, index=close.index)
     cross = (sma50.iloc[-1] > sma200.iloc[-1]) if len(sma200.dropna()) else False
     dist_200 = (close.iloc[-1] / sma200.iloc[-1] - 1.0) if not np.isnan(sma200.iloc[-1]) else np.nan
 
@@ -17,6 +17,8 @@ TTL = {
     "coingecko_live": timedelta(minutes=5),
     "holdings_daily": timedelta(hours=12),
 }
+# Same TTLs as whole seconds, the form st.cache_data and the disk caches take
+TTL_SECONDS = {k: int(v.total_seconds()) for k, v in TTL.items()}
 
 # Metric thresholds (initial policy)
 THRESHOLDS = {
@@ -62,13 +64,22 @@ ASSETS = {
     },
 }
 
+# Flat (region, display_name, provider, symbol) rows built once, for loops over every configured symbol
+ASSETS_FLAT = tuple(
+    (region, name, provider, sym)
+    for region, group in ASSETS.items()
+    for name, providers in group.items()
+    for provider, sym in providers.items()
+)
+
 # Misc constants
 SPY_HOLDINGS_CSV = "https://www.ssga.com/us/en/institutional/etfs/library-content/products/fund-data/etfs/us/holdings-daily-us-en-spy.csv"
 CBOE_VIX_CSV = "https://cdn.cboe.com/api/global/us_indices/daily_prices/VIX_History.csv"
 CBOE_PUTCALL_CSV = "https://cdn.cboe.com/api/global/us_indices/put_call_ratio/historical_put_call_ratios.csv"
 FRED_SERIES_CSV = "https://fred.stlouisfed.org/series/{sid}/downloaddata/{sid}.csv"
+STOOQ_CSV = "https://stooq.com/q/d/l/?s={symbol}&i={interval}"
 
-# Attempted FINRA margin debt URL candidates (the app tries in order until success)
+# Attempted FINRA margin debt URL candidates (fetched concurrently; the first in this order that parses wins)
 FINRA_MARGIN_CANDIDATES = [
     # Often updated path; we try several likely candidates
     "https://www.finra.org/sites/default/files/2024-07/industry-margin-statistics.xlsx",
@@ -81,3 +92,20 @@ SHILLER_XLS = "http://www.econ.yale.edu/~shiller/data/ie_data.xls"
 
 # Optional local fallback for Wilshire 5000 proxy (Buffett indicator)
 LOCAL_WILSHIRE_CSV = "data/wilshire_5000_proxy.csv"  # If present, app will use it
+
+# On-disk HTTP cache for ETag / Last-Modified revalidation (survives app restarts)
+HTTP_CACHE_DIR = ".http_cache"
+# If an upstream fails, its last good download is served (flagged STALE) for up to this long
+STALE_FALLBACK_TTL = timedelta(days=7)
+# ...and a frame parsed from such a copy is only cached this long before the upstream is retried
+STALE_RETRY_TTL = timedelta(minutes=10)
+# Entries are kept (for their ETag / Last-Modified validators) until they outlive the longest source TTL
+HTTP_CACHE_RETENTION = max(TTL.values()) + timedelta(days=7)
+
+# Parquet copies of parsed source frames, reused across restarts while younger than their TTL
+DISK_CACHE_DIR = "data/cache"
+
+# Built Vega-Lite chart specs (JSON), keyed by a hash of what they were built from; files older than
+# SPEC_CACHE_TTL are rebuilt and pruned
+SPEC_CACHE_DIR = ".streamlit_cache/specs"
+SPEC_CACHE_TTL = timedelta(days=2)
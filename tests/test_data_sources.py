@@ -0,0 +1,235 @@
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+import data_sources
+from settings import FINRA_MARGIN_CANDIDATES
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+
+@pytest.fixture
+def http_cache(tmp_path, monkeypatch):
+    # Offline HTTP cache in tmp_path; tests install their own responses per URL
+    monkeypatch.setattr(data_sources, "HTTP_CACHE_DIR", str(tmp_path / "http"))
+    monkeypatch.setattr(data_sources, "_stale_urls", {})
+    responses = {}
+
+    def fake_get(url, headers=None, timeout=None):
+        r = responses[url]
+        if isinstance(r, Exception):
+            raise r
+        return r(headers or {}) if callable(r) else r
+
+    monkeypatch.setattr(data_sources._session, "get", fake_get)
+    return responses
+
+
+def _margin_xlsx(value):
+    pytest.importorskip("openpyxl")
+    buf = io.BytesIO()
+    pd.DataFrame({"Date": ["2024-01-31"], "Debit Balances in Customers' Securities Margin Accounts": [value]}).to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def test_finra_prefers_fresh_candidate_over_stale_copy(http_cache):
+    raw_finra = data_sources.finra_margin_debt.__wrapped__.__wrapped__  # past st.cache_data and disk_cache
+    first, second = FINRA_MARGIN_CANDIDATES[:2]
+    for url in FINRA_MARGIN_CANDIDATES:
+        http_cache[url] = FakeResponse(404)
+    http_cache[first] = FakeResponse(200, _margin_xlsx(1.0))
+    assert raw_finra()["margin_debt"].iloc[-1] == 1.0
+
+    # First candidate now fails (a stale copy exists) while the second serves fresh data
+    http_cache[first] = FakeResponse(404)
+    http_cache[second] = FakeResponse(200, _margin_xlsx(2.0))
+    df = raw_finra()
+    assert df["margin_debt"].iloc[-1] == 2.0
+    assert not data_sources.frame_is_stale(df)
+
+    # Only the stale copy left: it is used, and the frame says so
+    http_cache[second] = FakeResponse(404)
+    df = raw_finra()
+    assert df["margin_debt"].iloc[-1] == 1.0
+    assert data_sources.frame_is_stale(df)
+
+
+def test_rejected_body_does_not_replace_last_good_copy(http_cache):
+    url = "https://example.test/prices.csv"
+    http_cache[url] = FakeResponse(200, b"Date,Close\n2024-01-02,1.5\n")
+    assert data_sources.fetch_csv(url, required=("Date", "Close"))["Close"].iloc[-1] == 1.5
+
+    # A 200 that is not the expected CSV (e.g. a rate-limit notice) falls back to the stored copy
+    http_cache[url] = FakeResponse(200, b"Exceeded the daily hits limit")
+    df = data_sources.fetch_csv(url, required=("Date", "Close"))
+    assert df["Close"].iloc[-1] == 1.5
+    assert data_sources.is_stale(url)
+    body_path, _ = data_sources._http_cache_paths(url)
+    assert open(body_path, "rb").read().startswith(b"Date,Close")
+
+
+def test_disk_cache_skips_stale_frames(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_sources, "DISK_CACHE_DIR", str(tmp_path))
+
+    @data_sources.disk_cache("probe", "stooq_daily")
+    def probe():
+        df = pd.DataFrame({"date": pd.to_datetime(["2024-01-02"]), "value": [1.0]})
+        df.attrs["stale_at"] = 0.0
+        return df
+
+    assert data_sources.frame_is_stale(probe())
+    assert not list(tmp_path.iterdir())
+
+
+def test_ohlc_csv_tolerates_blank_volume_and_short_rows(http_cache):
+    url = "https://example.test/ohlc.csv"
+    header = b"Date,Open,High,Low,Close,Volume\n"
+    http_cache[url] = FakeResponse(200, header + b"2024-01-02,1,1,1,1.5,100\n2024-01-03,1,1,1,2.5,\n")
+    df = data_sources.fetch_csv(url, required=("Date", "Close"), **data_sources.OHLC_CSV_OPTIONS)
+    assert df["Close"].tolist() == [1.5, 2.5] and df["Volume"].isna().tolist() == [False, True]
+
+    # Older rows without a Volume field are too short for the Arrow reader
+    http_cache[url] = FakeResponse(200, header + b"1950-01-03,1,1,1,1.5\n2024-01-03,1,1,1,2.5,5\n")
+    df = data_sources.fetch_csv(url, required=("Date", "Close"), **data_sources.OHLC_CSV_OPTIONS)
+    assert df["Close"].tolist() == [1.5, 2.5] and df["Close"].dtype == np.float32
+    assert pd.api.types.is_datetime64_any_dtype(df["Date"])
+    assert not data_sources.is_stale(url)
+
+
+def test_shiller_frame_has_unique_columns_and_persists(tmp_path, monkeypatch):
+    pytest.importorskip("openpyxl")
+    sheet = pd.DataFrame({
+        "Date": [1881.01, 1881.02], "P": [6.0, 6.1], "E": [0.4, 0.41], "Price": [150.0, 151.0],
+        "Earnings": [10.0, 10.2], "CAPE": ["NA", 18.5], "TR CAPE": [20.0, 20.5],
+    })
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf) as w:
+        sheet.to_excel(w, sheet_name="Data", index=False, startrow=7)
+    df = data_sources._parse_shiller(buf.getvalue())
+    assert list(df.columns) == ["date", "price", "earnings", "cape"]
+    assert df["price"].tolist() == [6.0, 6.1] and df["earnings"].tolist() == [0.4, 0.41]
+    assert np.isnan(df["cape"].iloc[0]) and df["cape"].iloc[1] == 18.5
+
+    monkeypatch.setattr(data_sources, "DISK_CACHE_DIR", str(tmp_path))
+    data_sources.disk_cache("shiller", "shiller_monthly")(lambda: df)()
+    pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / "shiller.parquet"), df)
+
+
+def test_http_cache_ignores_volatile_params_and_prunes_old_entries(http_cache):
+    base = "https://query1.finance.yahoo.com/v7/finance/download/^GSPC?period1=0&period2={}&interval=1d"
+    assert data_sources._http_cache_paths(base.format(1)) == data_sources._http_cache_paths(base.format(2))
+
+    old_url, new_url = "https://example.test/old.csv", "https://example.test/new.csv"
+    http_cache[old_url] = FakeResponse(200, b"a\n1\n", {"ETag": '"old"'})
+    http_cache[new_url] = FakeResponse(200, b"a\n2\n", {"ETag": '"new"'})
+    data_sources.http_get(old_url)
+    old_body, old_meta = data_sources._http_cache_paths(old_url)
+    os.utime(old_body, (0, 0))
+    data_sources.http_get(new_url)
+    assert not os.path.exists(old_body) and not os.path.exists(old_meta)
+    assert all(os.path.exists(p) for p in data_sources._http_cache_paths(new_url))
+
+
+def test_http_cache_keeps_validators_past_stale_fallback_window(http_cache):
+    # A monthly source refreshed after STALE_FALLBACK_TTL must still revalidate, even after other stores
+    slow_url, other_url = "https://example.test/monthly.xlsx", "https://example.test/daily.csv"
+    http_cache[slow_url] = FakeResponse(200, b"v1", {"ETag": '"m1"'})
+    http_cache[other_url] = FakeResponse(200, b"d1")
+    data_sources.http_get(slow_url)
+    slow_body, _ = data_sources._http_cache_paths(slow_url)
+    aged = time.time() - data_sources.STALE_FALLBACK_TTL.total_seconds() - 3600
+    os.utime(slow_body, (aged, aged))
+    data_sources.http_get(other_url)
+
+    seen = {}
+    def not_modified(headers):
+        seen.update(headers)
+        return FakeResponse(304)
+    http_cache[slow_url] = not_modified
+    assert data_sources.http_get(slow_url) == b"v1"
+    assert seen["If-None-Match"] == '"m1"'
+
+
+def test_source_cache_counts_hits_and_misses(monkeypatch):
+    monkeypatch.setattr(data_sources, "_source_calls", {})
+
+    @data_sources.source_cache("stooq_daily")
+    def probe_source(x):
+        return pd.DataFrame({"value": [x]})
+
+    probe_source(1); probe_source(1); probe_source(2)
+    (row,) = data_sources.source_cache_stats()
+    assert (row["func"], row["hits"], row["misses"]) == ("probe_source", 1, 2)
+
+
+def test_instrumented_cache_reports_nested_calls_separately():
+    calls = []
+
+    @data_sources.instrumented_cache(60, lambda result, miss, seconds: calls.append(("inner", miss)))
+    def inner_probe(x):
+        return x
+
+    @data_sources.instrumented_cache(60, lambda result, miss, seconds: calls.append(("outer", miss)))
+    def outer_probe(x):
+        return inner_probe(x)
+
+    inner_probe(7)
+    outer_probe(7)  # outer misses while the inner call inside it is a hit
+    assert calls == [("inner", True), ("inner", False), ("outer", True)]
+
+
+def test_shiller_month_dates_decode_yyyy_mm():
+    dates = data_sources._shiller_month_dates(pd.Series([1871.01, 1871.1, 1871.12, 2024.09, "x"]))
+    assert [(d.year, d.month) for d in dates.iloc[:4]] == [(1871, 1), (1871, 10), (1871, 12), (2024, 9)]
+    assert pd.isna(dates.iloc[4]) and str(dates.dt.tz) == "UTC"
+
+
+def test_http_get_revalidates_with_etag(http_cache):
+    url = "https://example.test/etag.csv"
+    http_cache[url] = FakeResponse(200, b"v1", {"ETag": '"abc"'})
+    assert data_sources.http_get(url) == b"v1"
+
+    seen = {}
+    def not_modified(headers):
+        seen.update(headers)
+        return FakeResponse(304)
+    http_cache[url] = not_modified
+    assert data_sources.http_get(url) == b"v1"
+    assert seen["If-None-Match"] == '"abc"'
+    assert not data_sources.is_stale(url)
+
+
+def test_http_get_serves_stale_copy_until_upstream_recovers(http_cache):
+    url = "https://example.test/flaky.csv"
+    http_cache[url] = FakeResponse(200, b"good")
+    data_sources.http_get(url)
+
+    http_cache[url] = requests.ConnectionError("down")
+    assert data_sources.http_get(url) == b"good"
+    assert data_sources.is_stale(url)
+
+    http_cache[url] = FakeResponse(200, b"better")
+    assert data_sources.http_get(url) == b"better"
+    assert not data_sources.is_stale(url)
+
+
+def test_http_get_raises_without_a_stored_copy(http_cache):
+    url = "https://example.test/never-fetched.csv"
+    http_cache[url] = FakeResponse(503)
+    with pytest.raises(requests.HTTPError):
+        data_sources.http_get(url)
+    assert not data_sources.is_stale(url)
@@ -2,7 +2,8 @@
 import pandas as pd
 import numpy as np
 
-from indicators import rolling_rsi, traffic_light, guidance_label
+import indicators
+from indicators import rolling_rsi, _rsi_pandas, _wilder_rsi, moving_mean, downsample_lttb, traffic_light, threshold_band, guidance_label
 from settings import THRESHOLDS
 
 def test_rsi_monotonic_on_trend():
@@ -11,6 +12,29 @@ def test_rsi_monotonic_on_trend():
     rsi = rolling_rsi(s, 14)
     assert rsi.iloc[-1] > 50
 
+def test_rsi_kernel_matches_pandas_path():
+    s = pd.Series(np.cumsum(np.random.default_rng(1).normal(0, 1, 1000)) + np.arange(1000, dtype=float))
+    expected = _rsi_pandas(s, 14).to_numpy()
+    np.testing.assert_allclose(_wilder_rsi(s.to_numpy(), 14), expected, equal_nan=True)
+    np.testing.assert_allclose(rolling_rsi(s, 14).to_numpy(), expected, equal_nan=True)
+
+def test_moving_mean_matches_pandas_rolling():
+    s = pd.Series(np.random.default_rng(0).normal(100, 5, 500))
+    expected = s.rolling(50).mean().to_numpy()
+    np.testing.assert_allclose(moving_mean(s.to_numpy(), 50), expected, equal_nan=True)
+    assert np.isnan(moving_mean(np.arange(10, dtype=float), 50)).all()
+
+def test_downsample_lttb_keeps_endpoints_and_extremes():
+    idx = pd.date_range("1900-01-01", periods=10_000, freq="D")
+    s = pd.Series(np.sin(np.linspace(0, 20, 10_000)), index=idx)
+    s.iloc[5_000] = 5.0  # spike must survive
+    out = downsample_lttb(s, 500)
+    assert len(out) == 500
+    assert out.index[0] == idx[0] and out.index[-1] == idx[-1]
+    assert out.index.is_monotonic_increasing
+    assert out.max() == 5.0
+    assert downsample_lttb(s.head(100), 500).equals(s.head(100))
+
 def test_traffic_light_basic():
     ranges = {"green": (None, 10), "yellow": (10, 20), "red": (20, None)}
     assert traffic_light(9.9, ranges) == "green"
@@ -18,6 +42,27 @@ def test_traffic_light_basic():
     assert traffic_light(21, ranges) == "red"
     assert traffic_light(None, ranges) == "grey"
 
+def test_traffic_light_band_bounds_are_inclusive_below():
+    band = threshold_band({"green": (None, 10), "yellow": (10, 20), "red": (20, None)})
+    assert [traffic_light(v, band) for v in (9.9, 10, 15, 20, 21, np.nan)] == ["green", "yellow", "yellow", "red", "red", "grey"]
+
+def test_threshold_band_keeps_zero_bound():
+    band = threshold_band(THRESHOLDS["margin_yoy"])
+    assert band.green_hi == 0.0 and band.yellow_hi == 0.10
+    assert traffic_light(-0.01, band) == "green" and traffic_light(0.0, band) == "yellow"
+
 def test_guidance_matrix():
     assert guidance_label("green","green").startswith("Accumulate")
     assert "Trim" in guidance_label("red","red")
+
+def test_ttm_pe_maps_monthly_eps_onto_daily_prices(monkeypatch):
+    months = pd.date_range("2023-01-01", "2024-01-01", freq="MS", tz="UTC")
+    shiller = pd.DataFrame({"date": months, "earnings": np.arange(1.0, 14.0)})  # TTM EPS: Dec 78, Jan 90
+    days = pd.to_datetime(["2023-11-15", "2023-12-15", "2024-01-15", "2024-03-15"])
+    prices = pd.DataFrame({"date": days, "close": 180.0})
+    monkeypatch.setattr(indicators, "shiller_dataset", lambda: shiller)
+    monkeypatch.setattr(indicators, "get_price_series", lambda *_: prices)
+    series = indicators.compute_ttm_pe()["series"]
+    # November has no 12-month EPS yet; March is past the last Shiller month and carries January's EPS
+    assert list(series.index) == list(days[1:])
+    np.testing.assert_allclose(series.to_numpy(), [180 / 78, 180 / 90, 180 / 90])
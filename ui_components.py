@@ -1,15 +1,20 @@
 
 # ui_components.py
 from __future__ import annotations
-from typing import Dict, Optional, List
+import os
+import html
+import json
+import time
+import hashlib
+from typing import Callable, Dict, Optional, List
 
 import numpy as np
 import pandas as pd
 import altair as alt
 import streamlit as st
 
-from settings import THRESHOLDS
-from indicators import guidance_label
+from settings import THRESHOLDS, SPEC_CACHE_DIR, SPEC_CACHE_TTL
+from indicators import guidance_label, lttb_indices
 
 COLOR_MAP = {
     "green": "#10B981",
@@ -18,24 +23,105 @@ COLOR_MAP = {
     "grey": "#9CA3AF",
 }
 
+
+# Traffic-light palette as CSS variables + badge classes, built once from COLOR_MAP; see inject_styles
+_TRAFFIC_CSS = (
+    "<style>:root{%s}"
+    ".tl{display:inline-block;padding:6px 10px;border-radius:999px;color:white;font-weight:600;}"
+    "%s</style>"
+) % (
+    "".join("--tl-%s:%s;" % (name, hex_) for name, hex_ in COLOR_MAP.items()),
+    "".join(".tl-%s{background:var(--tl-%s);}" % (name, name) for name in COLOR_MAP),
+)
+
+# HTML templates, filled with %-formatting per render
+_BADGE_TMPL = "<div class='tl tl-%s'>%s</div>"
+_CARD_TMPL = (
+    "<h4>%s</h4><p><strong>%s</strong></p>" + _BADGE_TMPL
+    + "<p><small style='opacity:0.7'>%s</small></p>"
+)
+_STRIP_TMPL = """
+<div style="padding:14px 18px;border-radius:12px;background:linear-gradient(90deg, rgba(99,102,241,0.15), rgba(34,211,238,0.15));border:1px solid rgba(0,0,0,0.05)">
+<strong>What this means:</strong> <span style="font-weight:600">%s</span>
+</div>
+"""
+
+def inject_styles():
+    # Once per script run (page-level style block), not per tile
+    st.markdown(_TRAFFIC_CSS, unsafe_allow_html=True)
+
+
+# Bump when a spec builder changes, so specs persisted under SPEC_CACHE_DIR are not reused
+_SPEC_VERSION = 2
+
+
+def _frame_digest(tag: str, df: pd.DataFrame) -> str:
+    # Content hash of a chart's input: spec version and Vega-Lite schema, the tag (chart kind, title),
+    # plus every value in the frame
+    h = hashlib.sha1(f"{_SPEC_VERSION}|{alt.SCHEMA_VERSION}|{tag}".encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _prune_spec_cache(cutoff: float) -> None:
+    try:
+        with os.scandir(SPEC_CACHE_DIR) as entries:
+            for entry in entries:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+    except OSError:
+        pass
+
+
+def _cached_spec(digest: str, builder: Callable[[], dict]) -> dict:
+    """
+    Vega-Lite spec from SPEC_CACHE_DIR/<digest>.json (digest from _frame_digest), built and written
+    on a miss. Files older than SPEC_CACHE_TTL count as misses and are pruned whenever a spec is written.
+    """
+    path = os.path.join(SPEC_CACHE_DIR, digest + ".json")
+    cutoff = time.time() - SPEC_CACHE_TTL.total_seconds()
+    try:
+        if os.path.getmtime(path) >= cutoff:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    spec = builder()
+    try:
+        os.makedirs(SPEC_CACHE_DIR, exist_ok=True)
+        _prune_spec_cache(cutoff)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(spec, f)
+        os.replace(tmp, path)
+    except (OSError, TypeError):
+        pass
+    return spec
+
+
+# Static sparkline spec; the day/value frame goes to st.vega_lite_chart as data= and is sent as Arrow,
+# which keeps its float32/int32 columns (inline spec datasets would be re-marshalled as int64/double)
+_SPARKLINE_SPEC = {
+    "mark": "line",
+    "encoding": {
+        "x": {"field": "day", "type": "quantitative", "axis": None},
+        "y": {"field": "value", "type": "quantitative", "axis": None},
+    },
+    "height": 60,
+}
+
+
 def gradient_card(title: str, value_str: str, spark_df: Optional[pd.DataFrame], color: str, footer: str, key: str):
-    # Build a simple Altair sparkline if provided
+    # Title, value, badge and footer go out as one HTML element; the sparkline (a day/value
+    # frame drawn with _SPARKLINE_SPEC, see series_tile) is the only other element in the card
+    color = color if color in COLOR_MAP else "grey"
     with st.container(border=True):
-        st.markdown(f"#### {title}")
-        st.markdown(f"**{value_str}**")
-        if spark_df is not None and not spark_df.empty:
-            line = alt.Chart(spark_df.reset_index()).mark_line().encode(
-                x=alt.X("date:T", axis=None),
-                y=alt.Y(spark_df.columns[0], axis=None)
-            ).properties(height=60)
-            st.altair_chart(line, use_container_width=True)
-        # traffic light badge
         st.markdown(
-            f"<div style='display:inline-block;padding:6px 10px;border-radius:999px;background:{COLOR_MAP.get(color, '#9CA3AF')};color:white;font-weight:600;'>"
-            f"{color.upper()}</div>",
-            unsafe_allow_html=True
+            _CARD_TMPL % (html.escape(title), html.escape(value_str), color, color.upper(), html.escape(footer)),
+            unsafe_allow_html=True,
         )
-        st.caption(footer)
+        if spark_df is not None:
+            st.vega_lite_chart(spark_df, _SPARKLINE_SPEC, use_container_width=True)
 
 
 def series_tile(title: str, metric: Dict, fmt: str, spark_from_series: bool = True):
@@ -46,30 +132,40 @@ def series_tile(title: str, metric: Dict, fmt: str, spark_from_series: bool = Tr
     source = metric.get("source", "")
     v = "—" if value is None else fmt.format(value)
     spark_df = None
-    if series is not None and hasattr(series, "to_frame"):
-        tail = series.tail(260).to_frame(name="value")
-        spark_df = tail
+    if isinstance(series, pd.Series) and not series.empty:
+        # Sparklines don't need float64: float32 values on int32 epoch days, kept as such in the Arrow payload
+        tail = series.tail(260)
+        spark_df = pd.DataFrame({
+            "day": tail.index.values.astype("datetime64[D]").astype(np.int32),
+            "value": tail.to_numpy(dtype=np.float32),
+        })
     footer = f"Updated: {last} · Source: {source}"
     gradient_card(title, v, spark_df, color, footer, key=title)
 
 
 def price_panel(title: str, trend: Dict):
-    import altair as alt
-    import pandas as pd
-    import streamlit as st
-
     if trend.get("error"):
         st.warning(trend["error"])
         return
     close = trend["close"]; sma50 = trend["sma50"]; sma200 = trend["sma200"]
     df = pd.DataFrame({"close": close, "sma50": sma50, "sma200": sma200}).reset_index().dropna()
-    chart = alt.Chart(df).mark_line().encode(
-        x="date:T",
-        y=alt.Y("close:Q", title=title),
-    )
-    c50 = alt.Chart(df).mark_line().encode(x="date:T", y="sma50:Q")
-    c200 = alt.Chart(df).mark_line().encode(x="date:T", y="sma200:Q")
-    st.altair_chart(chart + c50 + c200, use_container_width=True)
+    if df.empty:
+        # Fewer than 200 prices: no 200-day average yet, so no row survives dropna()
+        st.info("Not enough price history to chart the 200-day average yet.")
+    else:
+        if len(df) > 1500:
+            # Thin to 1500 rows picked on the close line; the SMAs follow the same dates
+            x = df["date"].astype("int64").to_numpy(dtype=np.float64)
+            df = df.iloc[lttb_indices(x - x[0], df["close"].to_numpy(dtype=np.float64), 1500)]
+        # One chart over the wide frame: the data ships once and is folded into series client-side
+        def build() -> dict:
+            return alt.Chart(df).transform_fold(["close", "sma50", "sma200"], as_=["series", "price"]).mark_line().encode(
+                x="date:T",
+                y=alt.Y("price:Q", title=title),
+                color="series:N",
+            ).to_dict()
+        spec = _cached_spec(_frame_digest(f"price|{title}", df), build)
+        st.vega_lite_chart(spec, use_container_width=True)
 
     cols = st.columns(3)
     with cols[0]:
@@ -82,21 +178,23 @@ def price_panel(title: str, trend: Dict):
 
 def overall_strip(valuation_color: str, trend_color: str):
     label = guidance_label(valuation_color, trend_color)
-    st.markdown(f"""
-<div style="padding:14px 18px;border-radius:12px;background:linear-gradient(90deg, rgba(99,102,241,0.15), rgba(34,211,238,0.15));border:1px solid rgba(0,0,0,0.05)">
-<strong>What this means:</strong> <span style="font-weight:600">{label}</span>
-</div>
-""", unsafe_allow_html=True)
+    st.markdown(_STRIP_TMPL % label, unsafe_allow_html=True)
 
 
-def data_health(items: List[Dict]):
-    rows = []
-    for m in items:
-        rows.append({
-            "Metric": m.get("name",""),
-            "Updated (UTC)": str(m.get("last")),
-            "Source": m.get("source",""),
-            "Status": m.get("status","OK" if m.get("value") is not None else "Missing"),
-        })
+def data_health(items: List[Dict], source_stats: Optional[List[Dict]] = None):
+    # Build column-wise; one list per column instead of a dict per row
+    df = pd.DataFrame({
+        "Metric": [m.get("name", "") for m in items],
+        "Updated (UTC)": [str(m.get("last")) for m in items],
+        "Source": [m.get("source", "") for m in items],
+        "Status": [m.get("status") or ("OK" if m.get("value") is not None else "Missing") for m in items],
+    })
     st.subheader("Data Health")
-    st.dataframe(pd.DataFrame(rows))
+    # Upstream down, last good download in use
+    st.dataframe(df.style.map(lambda s: "color: #B45309; font-weight: 600" if s == "STALE" else "", subset=["Status"]))
+    if source_stats:
+        # Per-fetcher cache hits/misses since process start; miss_seconds shows which endpoints dominate cold starts
+        stats = pd.DataFrame(source_stats)
+        stats["hit_ratio"] = (stats["hits"] / (stats["hits"] + stats["misses"]).clip(lower=1)).round(2)
+        stats["miss_seconds"] = stats["miss_seconds"].round(2)
+        st.dataframe(stats.sort_values("miss_seconds", ascending=False)[["func", "hits", "misses", "hit_ratio", "miss_seconds"]], hide_index=True)